@@ -0,0 +1,61 @@
+"""
+Response Cache
+
+In-process TTL cache for read endpoints.
+Entries hold already-serialized JSON bytes so a cache hit skips both the
+database round trip and Pydantic serialization. Each entry carries a weak
+ETag computed once when it is stored, for HTTP conditional requests.
+"""
+
+import hashlib
+import os
+from typing import NamedTuple, Optional, Tuple
+
+from cachetools import TTLCache
+
+CACHE_TTL = int(os.getenv("CACHE_TTL", 60))
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+_store = TTLCache(maxsize=512, ttl=CACHE_TTL)
+
+# Bumped by clear_cache so a fill that started before a clear can't put
+# stale data back afterwards
+_generations = {}
+_epoch = 0
+
+def cache_generation(namespace: str) -> Tuple[int, int]:
+    """Token identifying the namespace's current contents; pass to set_cached"""
+    return (_epoch, _generations.get(namespace, 0))
+
+def make_etag(body: bytes) -> str:
+    """Weak ETag derived from a short content hash"""
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+def get_cached(namespace: str, key: Optional[str]) -> Optional[CachedBody]:
+    """Return the cached entry for namespace/key, or None on a miss"""
+    return _store.get((namespace, key))
+
+def set_cached(namespace: str, key: Optional[str], body: bytes, generation: Tuple[int, int] = None) -> CachedBody:
+    """Store serialized bytes under namespace/key and return the entry.
+
+    If generation is given and the namespace was cleared since it was taken,
+    the entry is returned but not stored.
+    """
+    entry = CachedBody(body, make_etag(body))
+    if generation is None or generation == cache_generation(namespace):
+        _store[(namespace, key)] = entry
+    return entry
+
+def clear_cache(namespace: str = None):
+    """Drop every entry in a namespace, or the whole cache"""
+    global _epoch
+    if namespace is None:
+        _epoch += 1
+        _store.clear()
+        return
+    _generations[namespace] = _generations.get(namespace, 0) + 1
+    for k in [k for k in list(_store) if k[0] == namespace]:
+        _store.pop(k, None)
@@ -5,11 +5,11 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import Mapping, Sequence, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -21,35 +21,99 @@ db = None
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+# Connection pool sizing. Every worker process opens its own pool, so the
+# per-process maximum is a total budget split across the worker count, which
+# gunicorn.conf.py's post_fork hook exports as MONGO_POOL_WORKERS. Each worker
+# is async and multiplexes many requests, so it never gets fewer than
+# MONGO_MIN_CONNECTIONS_PER_WORKER sockets. minPoolSize keeps a couple of warm
+# sockets so early requests don't pay for connection setup.
+# MONGO_MAX_POOL_SIZE/MONGO_MIN_POOL_SIZE override the per-process values.
+MONGO_MAX_CONNECTIONS = int(os.getenv("MONGO_MAX_CONNECTIONS", 500))
+MONGO_MIN_CONNECTIONS_PER_WORKER = int(os.getenv("MONGO_MIN_CONNECTIONS_PER_WORKER", 20))
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+def _pool_sizes():
+    """Return (maxPoolSize, minPoolSize) for this process"""
+    workers = max(int(os.getenv("MONGO_POOL_WORKERS", 1)), 1)
+    default_max = max(MONGO_MAX_CONNECTIONS // workers, MONGO_MIN_CONNECTIONS_PER_WORKER)
+    max_size = int(os.getenv("MONGO_MAX_POOL_SIZE", default_max))
+    min_size = int(os.getenv("MONGO_MIN_POOL_SIZE", min(2, max_size)))
+    return max_size, min_size
+
+def connect_db():
+    """Create the client for this process and return the database handle.
+
+    Call from an application startup hook rather than at import time, so that
+    each Gunicorn worker opens its own pool after forking.
+    """
+    global _client, db
+    if _client is None and database_url and database_name:
+        max_pool_size, min_pool_size = _pool_sizes()
+        _client = AsyncIOMotorClient(
+            database_url,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            serverSelectionTimeoutMS=3000,
+            waitQueueTimeoutMS=2000,
+        )
+        db = _client[database_name]
+    return db
 
+def close_db():
+    """Close the client created by connect_db"""
+    global _client, db
+    if _client is not None:
+        _client.close()
+    _client = None
+    db = None
+
+def get_db():
+    """Return the current database handle, or None if not connected"""
+    return db
+
+def _to_document(data: Union[BaseModel, Mapping]) -> dict:
+    """Convert a model or dict into a timestamped document"""
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
     else:
-        data_dict = data.copy()
+        data_dict = dict(data)
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    now = datetime.now(timezone.utc)
+    data_dict['created_at'] = now
+    data_dict['updated_at'] = now
+    return data_dict
 
-    result = db[collection_name].insert_one(data_dict)
+# Helper functions for common database operations
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = await db[collection_name].insert_one(_to_document(data))
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def create_documents(collection_name: str, items: Sequence[Union[BaseModel, Mapping]], ordered: bool = False):
+    """Insert several documents with timestamps in one batched call"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = await db[collection_name].insert_many([_to_document(d) for d in items], ordered=ordered)
+    return [str(i) for i in result.inserted_ids]
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, optionally restricted to a field projection"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
+    cursor = db[collection_name].find(filter_dict or {}, projection)
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=limit)
+
+def iter_documents(collection_name: str, filter_dict: dict = None, projection: dict = None):
+    """Return an async cursor that yields documents as batches arrive"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return db[collection_name].find(filter_dict or {}, projection)
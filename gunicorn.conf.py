@@ -0,0 +1,21 @@
+"""
+Gunicorn configuration
+
+Production launcher: runs main:app on several Uvicorn workers so every core
+serves requests. Override the worker count with WEB_CONCURRENCY.
+
+Each worker opens its own Mongo pool; database.py divides the
+MONGO_MAX_CONNECTIONS budget by the worker count exported in post_fork.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+def post_fork(server, worker):
+    # server.cfg.workers is the effective count, including any -w/--workers
+    # given on the command line; database.py sizes the pool from it
+    os.environ["MONGO_POOL_WORKERS"] = str(server.cfg.workers)
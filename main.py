@@ -1,44 +1,121 @@
+import asyncio
+import logging
+import math
 import os
-from fastapi import FastAPI, HTTPException
+import orjson
+from types import MappingProxyType
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+from typing import AsyncIterator, List, Optional
 
-from database import db, create_document, get_documents
-from schemas import Watch, BlogPost, Order, OrderItem
+from cache import CACHE_TTL, CachedBody, cache_generation, get_cached, set_cached, clear_cache
+from database import connect_db, close_db, get_db, create_document, create_documents, get_documents, iter_documents
+from schemas import Watch, BlogPost, OrderItem
 
-app = FastAPI(title="LuxTime API", description="Backend for a luxury watch brand with blog and payments")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(
+    title="LuxTime API",
+    description="Backend for a luxury watch brand with blog and payments",
+    default_response_class=ORJSONResponse,
+)
+
+# Comma-separated list of allowed origins, held as a set for O(1) lookups.
+# Credentials are only enabled for an explicit list: with "*" plus
+# credentials Starlette echoes back any request Origin, which would give every
+# site credentialed access.
+CORS_ORIGINS = frozenset(o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip())
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=CORS_ORIGINS,
+    allow_credentials="*" not in CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def open_database():
+    db = connect_db()
+    if db is None:
+        return
+    # The pool is opened lazily; a ping connects before the first request does.
+    # Best effort only: the app must still boot (and /test report the problem)
+    # when Mongo is unreachable.
+    try:
+        await db.command("ping")
+    except Exception as e:
+        logger.warning("Database warm-up ping failed: %s", e)
+
+@app.on_event("startup")
+async def ensure_indexes():
+    # Idempotent: create_index is a no-op when the index already exists.
+    # Failures (server down, existing duplicate slugs) are logged, not fatal.
+    db = get_db()
+    if db is None:
+        return
+    for collection, keys in (("watch", "slug"), ("blogpost", "slug")):
+        try:
+            await db[collection].create_index(keys, unique=True)
+        except ServerSelectionTimeoutError as e:
+            # Server unreachable: don't wait out the timeout once per index
+            logger.warning("Skipping index creation, database unreachable: %s", e)
+            return
+        except Exception as e:
+            logger.warning("Could not create index on %s.%s: %s", collection, keys, e)
+
+@app.on_event("shutdown")
+async def close_database():
+    close_db()
+
+def _json(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+_ROOT_BODY = orjson.dumps({"message": "LuxTime Backend Running"})
+
 @app.get("/")
-def read_root():
-    return {"message": "LuxTime Backend Running"}
+async def read_root():
+    return _json(_ROOT_BODY)
+
+# Health checks hit /test often; collections rarely change, so reuse the
+# listCollections result for a short while
+_collections_cache = TTLCache(maxsize=1, ttl=int(os.getenv("COLLECTIONS_CACHE_TTL", 15)))
+
+async def _cached_collections(db) -> List[str]:
+    collections = _collections_cache.get("collections")
+    if collections is None:
+        collections = (await db.list_collection_names())[:10]
+        _collections_cache["collections"] = collections
+    return collections
+
+# Environment doesn't change at runtime; resolve /test's config fields once
+_DATABASE_URL_STATUS = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
+_DATABASE_NAME_STATUS = os.getenv("DATABASE_NAME") or "❌ Not Set"
+
+_TEST_RESPONSE = {
+    "backend": "✅ Running",
+    "database": "❌ Not Available",
+    "database_url": None,
+    "database_name": None,
+    "connection_status": "Not Connected",
+    "collections": ()
+}
 
 @app.get("/test")
-def test_database():
-    response = {
-        "backend": "✅ Running",
-        "database": "❌ Not Available",
-        "database_url": None,
-        "database_name": None,
-        "connection_status": "Not Connected",
-        "collections": []
-    }
+async def test_database():
+    response = _TEST_RESPONSE.copy()
+    db = get_db()
     try:
         if db is not None:
             response["database"] = "✅ Available"
-            response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = os.getenv("DATABASE_NAME") or "❌ Not Set"
+            response["database_url"] = _DATABASE_URL_STATUS
+            response["database_name"] = _DATABASE_NAME_STATUS
             try:
-                collections = db.list_collection_names()
-                response["collections"] = collections[:10]
+                response["collections"] = await _cached_collections(db)
                 response["database"] = "✅ Connected & Working"
                 response["connection_status"] = "Connected"
             except Exception as e:
@@ -50,116 +127,200 @@ def test_database():
     return response
 
 # Seed utility for demo content
+# Built once at import; read-only views so a request can't mutate them
+_DEMO_WATCHES = tuple(MappingProxyType(d) for d in [
+    {
+        "name": "Cosmograph Daytona",
+        "brand": "Rolex",
+        "price": 14999.0,
+        "description": "Iconic chronograph crafted in Oystersteel with Cerachrom bezel.",
+        "image": "https://images.unsplash.com/photo-1548171916-c0dea5c53030?q=80&w=1600&auto=format&fit=crop",
+        "slug": "cosmograph-daytona",
+        "in_stock": True,
+    },
+    {
+        "name": "Submariner Date",
+        "brand": "Rolex",
+        "price": 12999.0,
+        "description": "The archetype of the diver's watch with Oyster bracelet.",
+        "image": "https://images.unsplash.com/photo-1524805444758-089113d48a6d?q=80&w=1600&auto=format&fit=crop",
+        "slug": "submariner-date",
+        "in_stock": True,
+    },
+    {
+        "name": "GMT-Master II",
+        "brand": "Rolex",
+        "price": 13999.0,
+        "description": "Designed to show the time in two different time zones simultaneously.",
+        "image": "https://images.unsplash.com/photo-1594535182308-8ffb6d6b8a34?q=80&w=1600&auto=format&fit=crop",
+        "slug": "gmt-master-ii",
+        "in_stock": True,
+    },
+])
+
+_DEMO_POSTS = tuple(MappingProxyType(d) for d in [
+    {
+        "title": "The Art of Precision",
+        "excerpt": "Inside the craftsmanship that defines a legend.",
+        "content": "Precision is not an act, but a habit. Our timepieces embody decades of innovation and mastery.",
+        "cover_image": "https://images.unsplash.com/photo-1490367532201-b9bc1dc483f6?q=80&w=1600&auto=format&fit=crop",
+        "author": "Editorial Team",
+        "slug": "the-art-of-precision"
+    },
+    {
+        "title": "Diving into Excellence",
+        "excerpt": "Why divers trust our iconic Submariner.",
+        "content": "From the depths of the ocean to the boardroom, a symbol of performance and style.",
+        "cover_image": "https://images.unsplash.com/photo-1514890547357-a9ee0b733005?q=80&w=1600&auto=format&fit=crop",
+        "author": "Editorial Team",
+        "slug": "diving-into-excellence"
+    }
+])
+
+async def _insert_demo(collection_name: str, items) -> int:
+    # A concurrent /seed may have inserted the same slugs first; the unique
+    # index rejects the duplicates and we report only what we inserted
+    try:
+        return len(await create_documents(collection_name, items))
+    except BulkWriteError as e:
+        return e.details.get("nInserted", 0)
+
 class SeedResponse(BaseModel):
     inserted: int
 
 @app.post("/seed", response_model=SeedResponse)
-def seed_demo_content():
+async def seed_demo_content():
+    db = get_db()
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
 
-    # Only seed if empty
-    existing_watches = db["watch"].count_documents({})
-    existing_posts = db["blogpost"].count_documents({})
+    # Only seed if empty; metadata counts are enough and run concurrently
+    existing_watches, existing_posts = await asyncio.gather(
+        db["watch"].estimated_document_count(),
+        db["blogpost"].estimated_document_count(),
+    )
 
     inserted = 0
     if existing_watches == 0:
-        demo_watches = [
-            {
-                "name": "Cosmograph Daytona",
-                "brand": "Rolex",
-                "price": 14999.0,
-                "description": "Iconic chronograph crafted in Oystersteel with Cerachrom bezel.",
-                "image": "https://images.unsplash.com/photo-1548171916-c0dea5c53030?q=80&w=1600&auto=format&fit=crop",
-                "slug": "cosmograph-daytona",
-                "in_stock": True,
-            },
-            {
-                "name": "Submariner Date",
-                "brand": "Rolex",
-                "price": 12999.0,
-                "description": "The archetype of the diver's watch with Oyster bracelet.",
-                "image": "https://images.unsplash.com/photo-1524805444758-089113d48a6d?q=80&w=1600&auto=format&fit=crop",
-                "slug": "submariner-date",
-                "in_stock": True,
-            },
-            {
-                "name": "GMT-Master II",
-                "brand": "Rolex",
-                "price": 13999.0,
-                "description": "Designed to show the time in two different time zones simultaneously.",
-                "image": "https://images.unsplash.com/photo-1594535182308-8ffb6d6b8a34?q=80&w=1600&auto=format&fit=crop",
-                "slug": "gmt-master-ii",
-                "in_stock": True,
-            },
-        ]
-        for w in demo_watches:
-            create_document("watch", w)
-            inserted += 1
+        inserted += await _insert_demo("watch", _DEMO_WATCHES)
 
     if existing_posts == 0:
-        demo_posts = [
-            {
-                "title": "The Art of Precision",
-                "excerpt": "Inside the craftsmanship that defines a legend.",
-                "content": "Precision is not an act, but a habit. Our timepieces embody decades of innovation and mastery.",
-                "cover_image": "https://images.unsplash.com/photo-1490367532201-b9bc1dc483f6?q=80&w=1600&auto=format&fit=crop",
-                "author": "Editorial Team",
-                "slug": "the-art-of-precision"
-            },
-            {
-                "title": "Diving into Excellence",
-                "excerpt": "Why divers trust our iconic Submariner.",
-                "content": "From the depths of the ocean to the boardroom, a symbol of performance and style.",
-                "cover_image": "https://images.unsplash.com/photo-1514890547357-a9ee0b733005?q=80&w=1600&auto=format&fit=crop",
-                "author": "Editorial Team",
-                "slug": "diving-into-excellence"
-            }
-        ]
-        for p in demo_posts:
-            create_document("blogpost", p)
-            inserted += 1
+        inserted += await _insert_demo("blogpost", _DEMO_POSTS)
 
+    if inserted:
+        clear_cache("watch")
+        clear_cache("blogpost")
     return {"inserted": inserted}
 
 # Catalog endpoints
-@app.get("/watches", response_model=List[Watch])
-def list_watches():
-    docs = get_documents("watch")
-    # Convert _id to str-safe items
-    cleaned = []
-    for d in docs:
-        d.pop("_id", None)
-        cleaned.append(Watch(**d))
-    return cleaned
+# Read endpoints project exactly the public schema fields, so documents can be
+# serialized straight from Mongo without a Pydantic pass.
+_WATCH_PROJECTION = {"_id": 0, **{f: 1 for f in Watch.model_fields}}
+_POST_PROJECTION = {"_id": 0, **{f: 1 for f in BlogPost.model_fields}}
+
+# List items are rebuilt in schema field order with defaults filled in, so
+# they serialize exactly like the model-backed detail endpoints (e.g.
+# brand/in_stock on older watch documents). Absent required fields are skipped.
+_REQUIRED = object()
+
+def _schema_fields(model) -> tuple:
+    return tuple(
+        (k, _REQUIRED if f.is_required() else f.get_default(call_default_factory=True))
+        for k, f in model.model_fields.items()
+    )
+
+def _shape(d: dict, fields: tuple) -> dict:
+    return {k: d.get(k, default) for k, default in fields if k in d or default is not _REQUIRED}
+
+_WATCH_FIELDS = _schema_fields(Watch)
+_POST_FIELDS = _schema_fields(BlogPost)
+
+# Whole-collection list entries use a non-string cache key so they can never
+# collide with a document whose slug happens to be "all"
+_LIST_KEY = None
+
+async def _json_array_chunks(namespace: str, key: Optional[str], first, docs, fields: tuple,
+                             generation) -> AsyncIterator[bytes]:
+    # Emit the array as the cursor yields documents, caching the full body
+    # only once the last chunk has been produced
+    parts = [b"["]
+    yield parts[0]
+    if first is not None:
+        parts.append(orjson.dumps(_shape(first, fields)))
+        yield parts[-1]
+        async for d in docs:
+            parts.append(b"," + orjson.dumps(_shape(d, fields)))
+            yield parts[-1]
+    parts.append(b"]")
+    yield parts[-1]
+    set_cached(namespace, key, b"".join(parts), generation)
+
+# Catalog and blog content only changes on seed/admin cadence, so let
+# browsers and CDNs reuse it for as long as our own cache would
+_CACHE_CONTROL = f"public, max-age={CACHE_TTL}"
+
+async def _stream_json_array(namespace: str, key: Optional[str], docs, fields: tuple) -> StreamingResponse:
+    generation = cache_generation(namespace)
+    # Pull the first document before committing to a 200, so connection and
+    # query errors still surface as an error status rather than a cut-off body
+    try:
+        first = await docs.next()
+    except StopAsyncIteration:
+        first = None
+    return StreamingResponse(
+        _json_array_chunks(namespace, key, first, docs, fields, generation),
+        media_type="application/json",
+        headers={"Cache-Control": _CACHE_CONTROL},
+    )
+
+def _cached_response(request: Request, entry: CachedBody) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": _CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = {t.strip() for t in if_none_match.split(",")}
+    if entry.etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+@app.get("/watches", response_model=None, responses={200: {"model": List[Watch]}})
+async def list_watches(request: Request):
+    entry = get_cached("watch", _LIST_KEY)
+    if entry is None:
+        docs = iter_documents("watch", projection=_WATCH_PROJECTION)
+        return await _stream_json_array("watch", _LIST_KEY, docs, _WATCH_FIELDS)
+    return _cached_response(request, entry)
 
 @app.get("/watches/{slug}", response_model=Watch)
-def get_watch(slug: str):
-    docs = get_documents("watch", {"slug": slug}, limit=1)
-    if not docs:
-        raise HTTPException(status_code=404, detail="Watch not found")
-    d = docs[0]
-    d.pop("_id", None)
-    return Watch(**d)
+async def get_watch(slug: str, request: Request):
+    entry = get_cached("watch", slug)
+    if entry is None:
+        generation = cache_generation("watch")
+        docs = await get_documents("watch", {"slug": slug}, limit=1, projection=_WATCH_PROJECTION)
+        if not docs:
+            raise HTTPException(status_code=404, detail="Watch not found")
+        d = docs[0]
+        entry = set_cached("watch", slug, Watch.model_validate(d).model_dump_json().encode(), generation)
+    return _cached_response(request, entry)
 
 # Blog endpoints
-@app.get("/blog", response_model=List[BlogPost])
-def list_posts():
-    docs = get_documents("blogpost")
-    cleaned = []
-    for d in docs:
-        d.pop("_id", None)
-        cleaned.append(BlogPost(**d))
-    return cleaned
+@app.get("/blog", response_model=None, responses={200: {"model": List[BlogPost]}})
+async def list_posts(request: Request):
+    entry = get_cached("blogpost", _LIST_KEY)
+    if entry is None:
+        docs = iter_documents("blogpost", projection=_POST_PROJECTION)
+        return await _stream_json_array("blogpost", _LIST_KEY, docs, _POST_FIELDS)
+    return _cached_response(request, entry)
 
 @app.get("/blog/{slug}", response_model=BlogPost)
-def get_post(slug: str):
-    docs = get_documents("blogpost", {"slug": slug}, limit=1)
-    if not docs:
-        raise HTTPException(status_code=404, detail="Post not found")
-    d = docs[0]
-    d.pop("_id", None)
-    return BlogPost(**d)
+async def get_post(slug: str, request: Request):
+    entry = get_cached("blogpost", slug)
+    if entry is None:
+        generation = cache_generation("blogpost")
+        docs = await get_documents("blogpost", {"slug": slug}, limit=1, projection=_POST_PROJECTION)
+        if not docs:
+            raise HTTPException(status_code=404, detail="Post not found")
+        d = docs[0]
+        entry = set_cached("blogpost", slug, BlogPost.model_validate(d).model_dump_json().encode(), generation)
+    return _cached_response(request, entry)
 
 # Payments (simulated) endpoints
 class CheckoutRequest(BaseModel):
@@ -173,20 +334,22 @@ class CheckoutResponse(BaseModel):
     subtotal: float
 
 @app.post("/checkout", response_model=CheckoutResponse)
-def checkout(payload: CheckoutRequest):
-    # calculate subtotal
-    subtotal = sum(i.price * i.quantity for i in payload.items)
-    order = Order(
-        customer_name=payload.customer_name,
-        customer_email=payload.customer_email,
-        items=payload.items,
-        subtotal=subtotal,
-        status="confirmed",  # simulate success
-    )
-    order_id = create_document("order", order)
-    return {"order_id": order_id, "status": "confirmed", "subtotal": subtotal}
+async def checkout(payload: CheckoutRequest):
+    # calculate subtotal; fsum avoids accumulating float error across lines
+    subtotal = math.fsum(i.price * i.quantity for i in payload.items)
+    # Input was validated as CheckoutRequest; store the same shape as Order
+    order = {
+        "customer_name": payload.customer_name,
+        "customer_email": payload.customer_email,
+        "customer_phone": None,
+        "items": [i.model_dump() for i in payload.items],
+        "subtotal": subtotal,
+        "status": "confirmed",  # simulate success
+    }
+    order_id = await create_document("order", order)
+    return ORJSONResponse({"order_id": order_id, "status": "confirmed", "subtotal": subtotal})
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, loop="uvloop", http="httptools")